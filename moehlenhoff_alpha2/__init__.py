@@ -4,21 +4,83 @@
 Released under the GNU General Public License v3.0
 """
 
+import io
+import re
+import sys
 import time
-from typing import Union, Generator, Dict
+from typing import Callable, Union, Generator, Dict, Optional, Tuple
 import logging
 import asyncio
 import aiohttp
-import xmltodict
 from datetime import datetime
 
+try:
+    from lxml import etree
+
+    _LXML = True
+except ImportError:  # pragma: no cover
+    from xml.etree import ElementTree as etree
+
+    _LXML = False
+
 
 logger = logging.getLogger(__name__)
 
 __version__ = "1.3.0"
 
+# Host and optional path with optional scheme and trailing slash
+_HOST_RE = re.compile(r"^(?:https?://)?(.*?)/?$", re.IGNORECASE)
+
+
+def _etree_to_dict(elem, skip: tuple = ()) -> Union[dict, str, None]:
+    """Convert an element into the structure xmltodict would return"""
+    # Names repeat for every entity, interning keeps one string per name
+    result = {sys.intern(f"@{key}"): value for key, value in elem.attrib.items()}
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str) or tag in skip:
+            # Comments, processing instructions and skipped elements
+            continue
+        tag = sys.intern(tag)
+        value = _etree_to_dict(child)
+        if tag in result:
+            if not isinstance(result[tag], list):
+                result[tag] = [result[tag]]
+            result[tag].append(value)
+        else:
+            result[tag] = value
+    text = elem.text.strip() if elem.text else None
+    if text:
+        if not result:
+            return text
+        result["#text"] = text
+    return result or None
+
+
+def _bool_from_xml(value: str) -> bool:
+    """Convert xml boolean value"""
+    return bool(int(value))
+
+
+_BOOL_FOR_XML = {True: "1", False: "0", "1": "1", "0": "0"}
+
+
+def _bool_for_xml(value) -> str:
+    """Convert boolean value for xml"""
+    return _BOOL_FOR_XML.get(value) or ("1" if value else "0")
+
+
+def _float_for_xml(value) -> str:
+    """Convert float value for xml"""
+    if isinstance(value, str):
+        value = float(value)
+    return f"{value:0.1f}"
 
-class Alpha2Base:
+
+_TO_XML = {bool: _bool_for_xml, float: _float_for_xml}
+
+
+class Alpha2Base:  # pylint: disable=too-many-instance-attributes
     """Class representing one alpha2 base"""
 
     _TYPES = {
@@ -74,222 +136,391 @@ class Alpha2Base:
             "T_TARGET_MAX": float,
         },
     }
+    # Conversion plans per entity type, built once from _TYPES.
+    # Values parsed from xml are already strings, str attributes need no conversion.
+    _CONVERTERS_FROM_XML = {
+        entity_type: tuple(
+            (attribute, _bool_from_xml if _type is bool else _type)
+            for attribute, _type in types.items()
+            if _type is not str
+        )
+        for entity_type, types in _TYPES.items()
+    }
+    _CONVERTERS_FOR_XML = {
+        entity_type: {
+            attribute: _TO_XML.get(_type, str) for attribute, _type in types.items()
+        }
+        for entity_type, types in _TYPES.items()
+    }
+    _ENTITY_TYPES = ("HEATAREA", "HEATCTRL", "IODEVICE")
+    _COMMAND_TEMPLATE = (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b"<Devices><Device><ID>%b</ID>%b</Device></Devices>"
+    )
+    _heat_area_update_delay = 0.05
+    _command_poll_delay = 0.25
     _command_poll_interval = 2.0
     _command_timeout = 10.0
     _client_timeout = aiohttp.ClientTimeout(total=10)
 
     def __init__(self, host: str) -> None:
-        self.base_url = f"http://{host}"
-        self.static_data = None
+        # The base only supports http
+        self.base_url = f"http://{_HOST_RE.match(host).group(1)}"
+        self._static_data = None
+        self._device = None
+        # Guards updates of static data, commands are serialized by the connector
         self._update_lock = asyncio.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._io_devices: Tuple[Dict, ...] = ()
+        self._heat_controls: Tuple[Dict, ...] = ()
+        self._heat_controls_by_nr: Dict[int, Dict] = {}
+        self._heat_areas: Tuple[Dict, ...] = ()
+        self._heat_area_nrs: Dict[str, int] = {}
+        # Conditional request headers for static data
+        self._static_data_headers: Dict[str, str] = {}
+        # Incremented when a command is started and when it is done
+        self._command_count = 0
+        self._pending_heat_area_updates: Dict[tuple, dict] = {}
+        self._heat_area_update_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "Alpha2Base":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the client session, create a new one if needed"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self._client_timeout,
+                # Only one request is sent to the base at a time
+                connector=aiohttp.TCPConnector(
+                    limit=1, limit_per_host=1, ttl_dns_cache=300, keepalive_timeout=120
+                ),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the client session"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     @classmethod
     def convert_types_from_xml(cls, entity_type: str, data: dict) -> dict:
         """Convert types in data structure from xlm"""
-        _types = cls._TYPES.get(entity_type)
-        if not _types:
+        converters = cls._CONVERTERS_FROM_XML.get(entity_type)
+        if converters is None:
             raise ValueError(f"Invalid entity type '{entity_type}'")
         data = data.copy()
-        for attribute in data:
-            if attribute in _types:
-                if _types[attribute] is bool:
-                    data[attribute] = bool(int(data[attribute]))
-                else:
-                    data[attribute] = _types[attribute](data[attribute])
+        for attribute, converter in converters:
+            value = data.get(attribute)
+            if value is not None:
+                data[attribute] = converter(value)
+        number = data.pop("@nr", None)
+        if number is not None:
+            data["NR"] = int(number)
         return data
 
     @classmethod
     def convert_types_for_xml(cls, entity_type: str, data: dict) -> dict:
         """Convert types in data structure for xlm"""
-        _types = cls._TYPES.get(entity_type)
-        if not _types:
+        converters = cls._CONVERTERS_FOR_XML.get(entity_type)
+        if converters is None:
             raise ValueError(f"Invalid entity type '{entity_type}'")
-        data = data.copy()
-        for attribute in data:
-            if attribute in _types:
-                if _types[attribute] is bool:
-                    data[attribute] = (
-                        "1" if data[attribute] and data[attribute] != "0" else "0"
-                    )
-                    continue
-                if _types[attribute] is float:
-                    data[attribute] = f"{float(data[attribute]):0.1f}"
-                    continue
-            data[attribute] = str(data[attribute])
-        return data
+        return {
+            attribute: converters.get(attribute, str)(value)
+            for attribute, value in data.items()
+        }
 
     async def _send_command(self, device_id: str, command: str) -> str:
         """Send a command to the base with device_id"""
-        xml = (
-            '<?xml version="1.0" encoding="UTF-8"?>\n'
-            "<Devices><Device>"
-            f"<ID>{device_id}</ID>{command}"
-            "</Device></Devices>"
-        )
-        async with aiohttp.ClientSession(timeout=self._client_timeout) as session:
+        xml = self._COMMAND_TEMPLATE % (device_id.encode("utf-8"), command.encode("utf-8"))
+        # Commands change the state of the base, next static data fetch is unconditional
+        self._static_data_headers = {}
+        self._command_count += 1
+        session = await self._get_session()
+        try:
             for trynum in (1, 2):
                 try:
                     async with session.post(
-                        f"{self.base_url}/data/changes.xml", data=xml.encode("utf-8")
+                        f"{self.base_url}/data/changes.xml", data=xml
                     ) as response:
                         response.raise_for_status()
                         return await response.text()
                 except (UnicodeDecodeError, aiohttp.ClientError):
                     if trynum == 2:
                         raise
+        finally:
+            self._command_count += 1
 
     async def send_command(self, command: str) -> str:
         """Send a command to the base"""
-        async with self._update_lock:
-            return await self._send_command(self.id, command)
+        return await self._send_command(self.id, command)
 
     def _ensure_static_data(self) -> None:
         """Ensure that static data is available"""
         if not self.static_data:
             raise RuntimeError("Static data not available")
 
-    async def _fetch_static_data(self) -> str:
-        async with aiohttp.ClientSession(timeout=self._client_timeout) as session:
-            for trynum in (1, 2):
-                try:
-                    async with session.get(
-                        f"{self.base_url}/data/static.xml"
-                    ) as response:
-                        response.raise_for_status()
-                        return await response.text()
-                except (UnicodeDecodeError, aiohttp.ClientError):
-                    if trynum == 2:
-                        raise
+    async def _fetch_static_data(self, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[bytes], Dict[str, str]]:
+        """Fetch static data and the conditional request headers for the next fetch,
+        data is None if not modified since the fetch the conditional request headers are from"""
+        if headers is None:
+            headers = self._static_data_headers
+        command_count = self._command_count
+        session = await self._get_session()
+        for trynum in (1, 2):
+            try:
+                async with session.get(
+                    f"{self.base_url}/data/static.xml",
+                    headers=headers,
+                ) as response:
+                    if response.status == 304:
+                        return None, headers
+                    response.raise_for_status()
+                    # The xml parser decodes according to the xml declaration
+                    data = await response.read()
+                    if self._command_count != command_count:
+                        # Fetched while a command was sent, the validators may not reflect the command
+                        return data, {}
+                    return data, {
+                        header: response.headers[validator]
+                        for validator, header in (
+                            ("ETag", "If-None-Match"),
+                            ("Last-Modified", "If-Modified-Since"),
+                        )
+                        if validator in response.headers
+                    }
+            except aiohttp.ClientError:
+                if trynum == 2:
+                    raise
 
-    async def _get_static_data(self) -> dict:
-        """Get and process static data"""
-        data = await self._fetch_static_data()
-        data = xmltodict.parse(data)
-        for _type in ("HEATAREA", "HEATCTRL", "IODEVICE"):
-            if not isinstance(data["Devices"]["Device"][_type], list):
-                data["Devices"]["Device"][_type] = [data["Devices"]["Device"][_type]]
-        return data
+    def _parse_static_xml(self, data: Union[str, bytes]) -> dict:
+        """Parse static data xml"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        entities = {entity_type: [] for entity_type in self._ENTITY_TYPES}
+        device = None
+        # lxml only reports the elements of interest
+        kwargs = {"tag": self._ENTITY_TYPES + ("Device",), "resolve_entities": False} if _LXML else {}
+        for _event, elem in etree.iterparse(io.BytesIO(data), events=("end",), **kwargs):
+            if elem.tag in entities:
+                # Entities are complete at their end event, no need to keep the elements
+                entity = _etree_to_dict(elem) or {}
+                entities[elem.tag].append(entity)
+                elem.clear()
+            elif elem.tag == "Device":
+                device = _etree_to_dict(elem, self._ENTITY_TYPES) or {}
+                device.update(entities)
+        if device is None:
+            raise ValueError("No device found in static data")
+        return {"Devices": {"Device": device}}
+
+    async def _get_static_data(self, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[dict], Dict[str, str]]:
+        """Get and process static data, data is None if not modified"""
+        data, headers = await self._fetch_static_data(headers)
+        if data is None:
+            return None, headers
+        return self._parse_static_xml(data), headers
+
+    def _set_static_data(self, data: Optional[dict], headers: Dict[str, str]) -> None:
+        """Set static data and update the values derived from it, nothing is changed if data is invalid"""
+        if data is None:
+            device, io_devices, heat_controls, heat_areas = None, (), (), ()
+        else:
+            device = data["Devices"]["Device"]
+            io_devices = tuple(self._iter_entities(device, "IODEVICE"))
+            heat_controls = tuple(self._iter_entities(device, "HEATCTRL"))
+            heat_areas = tuple(self._iter_entities(device, "HEATAREA"))
+        # First non-zero state of the heat controls in use, by heat area number
+        heatctrl_states = {}
+        for heat_control in heat_controls:
+            state = heat_control["HEATCTRL_STATE"]
+            if heat_control["INUSE"] and state:
+                heatctrl_states.setdefault(heat_control["HEATAREA_NR"], state)
+        heat_area_ids = {}
+        for heat_area in heat_areas:
+            heat_area["_HEATCTRL_STATE"] = heatctrl_states.get(heat_area["NR"], 0)
+            heat_area_ids[heat_area["NR"]] = heat_area["ID"]
+        for entity in heat_controls + io_devices:
+            entity["_HEATAREA_ID"] = heat_area_ids.get(entity["HEATAREA_NR"])
+        self._static_data = data
+        self._device = device
+        self._io_devices = io_devices
+        self._heat_controls = heat_controls
+        self._heat_controls_by_nr = {heat_control["NR"]: heat_control for heat_control in heat_controls}
+        self._heat_areas = heat_areas
+        self._heat_area_nrs = {heat_area_id: nr for nr, heat_area_id in heat_area_ids.items()}
+        # Only fetch conditionally once the data has been processed successfully
+        self._static_data_headers = headers
+
+    @property
+    def static_data(self) -> Optional[dict]:
+        """Return the static data as parsed from static.xml"""
+        return self._static_data
+
+    @static_data.setter
+    def static_data(self, data: Optional[dict]) -> None:
+        """Set the static data, the next fetch is unconditional"""
+        self._set_static_data(data, {})
 
     async def update_data(self) -> None:
         """Update local data"""
         async with self._update_lock:
-            self.static_data = await self._get_static_data()
+            data, headers = await self._get_static_data()
+            if data is None:
+                logger.debug("Static data from '%s' not modified", self.base_url)
+                return
+            self._set_static_data(data, headers)
             logger.debug(
                 "Static data updated from '%s', device name is '%s', %d heat areas, %d heat controls and %d io devices found",
                 self.base_url,
                 self.name,
-                len(self.static_data["Devices"]["Device"]["HEATAREA"]),
-                len(self.static_data["Devices"]["Device"]["HEATCTRL"]),
-                len(self.static_data["Devices"]["Device"]["IODEVICE"]),
+                len(self._device["HEATAREA"]),
+                len(self._device["HEATCTRL"]),
+                len(self._device["IODEVICE"]),
             )
 
     @property
     def name(self) -> str:
         """Return the name of the base"""
         self._ensure_static_data()
-        return self.static_data["Devices"]["Device"]["NAME"]
+        return self._device["NAME"]
 
     @property
     def id(self) -> str:  # pylint: disable=invalid-name
         """Return the id of the base"""
         self._ensure_static_data()
-        return self.static_data["Devices"]["Device"]["ID"]
+        return self._device["ID"]
 
     @property
-    def io_devices(self) -> Generator[Dict, None, None]:
-        """Return all io devices"""
+    def io_devices(self) -> Tuple[Dict, ...]:
+        """Return all io devices, the entities are shared and must not be modified"""
         self._ensure_static_data()
-        device = self.static_data["Devices"]["Device"]
-        for io_device in device["IODEVICE"]:
-            io_device = self.convert_types_from_xml("IODEVICE", io_device)
-            io_device["NR"] = int(io_device["@nr"])
-            del io_device["@nr"]
-            io_device["ID"] = f"{device['ID']}:{io_device['NR']}"
-            io_device["_HEATAREA_ID"] = f"{device['ID']}:{io_device['HEATAREA_NR']}" if io_device['HEATAREA_NR'] else None
-            yield io_device
+        return self._io_devices
 
     @property
-    def heat_controls(self) -> Generator[Dict, None, None]:
-        """Return all heat controls"""
+    def heat_controls(self) -> Tuple[Dict, ...]:
+        """Return all heat controls, the entities are shared and must not be modified"""
         self._ensure_static_data()
-        device = self.static_data["Devices"]["Device"]
-        for heat_control in device["HEATCTRL"]:
-            heat_control = self.convert_types_from_xml("HEATCTRL", heat_control)
-            heat_control["NR"] = int(heat_control["@nr"])
-            del heat_control["@nr"]
-            heat_control["ID"] = f"{device['ID']}:{heat_control['NR']}"
-            heat_control["_HEATAREA_ID"] = f"{device['ID']}:{heat_control['HEATAREA_NR']}" if heat_control['HEATAREA_NR'] else None
-            yield heat_control
+        return self._heat_controls
 
     @property
-    def heat_areas(self) -> Generator[Dict, None, None]:
-        """Return all heat areas"""
+    def heat_areas(self) -> Tuple[Dict, ...]:
+        """Return all heat areas, the entities are shared and must not be modified"""
         self._ensure_static_data()
-        device = self.static_data["Devices"]["Device"]
-        for heat_area in device["HEATAREA"]:
-            heat_area = self.convert_types_from_xml("HEATAREA", heat_area)
-            heat_area["NR"] = int(heat_area["@nr"])
-            del heat_area["@nr"]
-            heat_area["ID"] = f"{device['ID']}:{heat_area['NR']}"
-            heat_area["_HEATCTRL_STATE"] = 0
-            for heatctrl in device["HEATCTRL"]:
-                if (
-                    heatctrl["INUSE"]
-                    and int(heatctrl["HEATAREA_NR"]) == heat_area["NR"]
-                ):
-                    heat_area["_HEATCTRL_STATE"] = int(heatctrl["HEATCTRL_STATE"])
-                    if heat_area["_HEATCTRL_STATE"]:
-                        break
-            yield heat_area
+        return self._heat_areas
+
+    def get_heat_control(self, nr: int) -> Optional[Dict]:  # pylint: disable=invalid-name
+        """Return the heat control with number nr, the entity is shared and must not be modified"""
+        self._ensure_static_data()
+        return self._heat_controls_by_nr.get(nr)
+
+    def _iter_entities(self, device: dict, entity_type: str) -> Generator[Dict, None, None]:
+        """Convert entities of entity_type from the device static data"""
+        id_prefix = f"{device['ID']}:"
+        for entity in device[entity_type]:
+            entity = self.convert_types_from_xml(entity_type, entity)
+            entity["ID"] = id_prefix + str(entity["NR"])
+            yield entity
 
     @property
     def cooling(self) -> bool:
         """Return if cooling mode is active"""
         self._ensure_static_data()
-        return int(self.static_data["Devices"]["Device"]["COOLING"]) == 1
+        return int(self._device["COOLING"]) == 1
+
+    async def _poll_static_data(self, condition: Callable[[dict], bool]) -> Tuple[dict, Dict[str, str]]:
+        """Poll static data with increasing delay until condition is met"""
+        delay = min(self._command_poll_delay, self._command_poll_interval)
+        # The first poll is unconditional, later polls are conditional on the previous one
+        headers: Dict[str, str] = {}
+        while True:
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.6, self._command_poll_interval)
+            data, headers = await self._get_static_data(headers)
+            # None means unchanged since the previous poll
+            if data is not None and condition(data):
+                return data, headers
 
     async def set_cooling(self, value: bool) -> None:
         """Set cooling mode"""
         # Needs <RELAIS><FUNCTION>1</FUNCTION></RELAIS>
         value = 1 if value else 0
-        self.static_data["Devices"]["Device"]["COOLING"] = value
+        self._device["COOLING"] = value
         command = f"<COOLING>{value}</COOLING>"
         async with self._update_lock:
-            await self._send_command(self.id, command)
             start = time.time()
-            while True:
-                await asyncio.sleep(self._command_poll_interval)
-                data = await self._get_static_data()
-                if int(data["Devices"]["Device"]["COOLING"]) == value:
-                    self.static_data = data
-                    break
-                elapsed = time.time() - start
-                if elapsed > self._command_timeout:
+            # Start polling while the command is sent
+            poll = asyncio.create_task(
+                self._poll_static_data(lambda data: int(data["Devices"]["Device"]["COOLING"]) == value)
+            )
+            try:
+                await self._send_command(self.id, command)
+                try:
+                    data, headers = await asyncio.wait_for(poll, self._command_timeout - (time.time() - start))
+                except asyncio.TimeoutError:
                     raise TimeoutError(
-                        f"Timed out after {elapsed:0.0f} seconds while waiting for command to take effect"
-                    )
+                        f"Timed out after {time.time() - start:0.0f} seconds while waiting for command to take effect"
+                    ) from None
+            except BaseException:
+                poll.cancel()
+                # static_data does not match the last fetched data anymore
+                self._static_data_headers = {}
+                raise
+            self._set_static_data(data, headers)
 
     async def update_heat_area(self, heat_area_id: Union[str, int], attributes: dict):
         """Update heat area attributes on base"""
-        heat_area_id = str(heat_area_id)
-        device_id = None
-        ha_nr = None
-        if ":" in heat_area_id:
+        if isinstance(heat_area_id, int):
+            device_id, ha_nr = self.id, heat_area_id
+        elif heat_area_id in self._heat_area_nrs:
+            device_id, ha_nr = self.id, self._heat_area_nrs[heat_area_id]
+        elif ":" in heat_area_id:
             device_id, ha_nr = heat_area_id.split(":")
         else:
-            device_id = self.id
-            ha_nr = heat_area_id
-        command = f'<HEATAREA nr="{ha_nr}">'
+            device_id, ha_nr = self.id, heat_area_id
         attributes = self.convert_types_for_xml("HEATAREA", attributes)
-        for attr, val in attributes.items():
-            command += f"<{attr}>{val}</{attr}>"
-        command += "</HEATAREA>"
-        async with self._update_lock:
-            await self._send_command(device_id, command)
+        if self._heat_area_update_task is not None and self._heat_area_update_task.done():
+            # The batch was cancelled before it started
+            self._pending_heat_area_updates = {}
+            self._heat_area_update_task = None
+        # Updates arriving within _heat_area_update_delay are sent in one command
+        self._pending_heat_area_updates.setdefault((device_id, str(ha_nr)), {}).update(attributes)
+        if self._heat_area_update_task is None:
+            self._heat_area_update_task = asyncio.create_task(self._send_heat_area_updates())
+        errors = await asyncio.shield(self._heat_area_update_task)
+        if device_id in errors:
+            raise errors[device_id]
+
+    async def _send_heat_area_updates(self) -> Dict[str, Exception]:
+        """Send pending heat area updates, one command per base, returns the errors by device id"""
+        try:
+            await asyncio.sleep(self._heat_area_update_delay)
+        finally:
+            # Later updates start a new batch, a cancelled batch is dropped
+            pending = self._pending_heat_area_updates
+            self._pending_heat_area_updates = {}
+            self._heat_area_update_task = None
+        commands: Dict[str, list] = {}
+        for (device_id, ha_nr), attributes in pending.items():
+            parts = commands.setdefault(device_id, [])
+            parts.append(f'<HEATAREA nr="{ha_nr}">')
+            parts.extend(f"<{attr}>{val}</{attr}>" for attr, val in attributes.items())
+            parts.append("</HEATAREA>")
+        errors = {}
+        for device_id, parts in commands.items():
+            try:
+                await self._send_command(device_id, "".join(parts))
+            except Exception as err:  # pylint: disable=broad-except
+                # Raised to the callers updating heat areas of this device only
+                errors[device_id] = err
+        return errors
 
     async def set_datetime(self, value: datetime = None) -> None:
         """Set base date and time"""
         value = value or datetime.now()
         command = f"<DATETIME>{value.strftime('%Y-%m-%dT%H:%M:%S')}</DATETIME>"
-        async with self._update_lock:
-            await self._send_command(self.id, command)
+        await self._send_command(self.id, command)
@@ -1,9 +1,48 @@
 """pytest conftest"""
 
+import os
+from contextlib import asynccontextmanager
+
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from moehlenhoff_alpha2 import Alpha2Base
 
 
 @pytest.hookimpl
 def pytest_configure(config):
     """Set pytest config options"""
     config.option.asyncio_mode = "auto"
+    config.addinivalue_line("markers", "xdist_group(name): run tests of a group in the same pytest-xdist worker")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(items):
+    """Run all tests using the real base in the same pytest-xdist worker"""
+    for item in items:
+        if "base" in getattr(item, "fixturenames", ()):
+            item.add_marker(pytest.mark.xdist_group("base"))
+
+
+@pytest.fixture(name="base")
+async def fixture_base():
+    """Base at ALPHA2_BASE_ADDRESS, the client session is closed after the test"""
+    async with Alpha2Base(os.environ["ALPHA2_BASE_ADDRESS"]) as base:
+        yield base
+
+
+@pytest.fixture(name="local_base")
+def fixture_local_base():
+    """Context manager for a base connected to a local server with the given route handlers"""
+    @asynccontextmanager
+    async def _local_base(static_xml=None, changes_xml=None):
+        app = web.Application()
+        if static_xml:
+            app.router.add_get("/data/static.xml", static_xml)
+        if changes_xml:
+            app.router.add_post("/data/changes.xml", changes_xml)
+        async with TestServer(app) as server:
+            async with Alpha2Base(f"{server.host}:{server.port}") as base:
+                yield base
+    return _local_base
@@ -4,11 +4,54 @@ import asyncio
 from unittest.mock import patch
 from datetime import datetime
 
+import aiohttp
 import pytest
+import xmltodict
+from aiohttp import web
 
 from moehlenhoff_alpha2 import Alpha2Base
 
 ALPHA2_BASE_ADDRESS = os.environ.get("ALPHA2_BASE_ADDRESS")
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _read_xml_file(xml_file):
+    with open(os.path.join(DATA_DIR, xml_file), "rb") as file:
+        return file.read()
+
+
+_XML_CACHE = {xml_file: _read_xml_file(xml_file) for xml_file in ("static1.xml", "static2.xml")}
+
+
+@pytest.fixture(scope="session", name="parsed_bases")
+def fixture_parsed_bases():
+    """Bases with static data parsed from the test files, by file name"""
+    async def _parsed_base(xml_file):
+        async def _fetch_static_data(_self, _headers=None):
+            return _XML_CACHE[xml_file], {}
+        with patch("moehlenhoff_alpha2.Alpha2Base._fetch_static_data", _fetch_static_data):
+            base = Alpha2Base("127.0.0.1")
+            await base.update_data()
+            return base
+    return {xml_file: asyncio.run(_parsed_base(xml_file)) for xml_file in _XML_CACHE}
+
+
+@pytest.mark.parametrize(
+    'host, base_url',
+    (
+        ("192.168.1.1", "http://192.168.1.1"),
+        ("192.168.1.1/", "http://192.168.1.1"),
+        ("http://192.168.1.1", "http://192.168.1.1"),
+        ("https://192.168.1.1/", "http://192.168.1.1"),
+        ("HTTP://192.168.1.1", "http://192.168.1.1"),
+        ("alpha2:8080", "http://alpha2:8080"),
+        ("proxy.local/alpha2", "http://proxy.local/alpha2"),
+        ("http://proxy.local/alpha2/", "http://proxy.local/alpha2")
+    )
+)
+def test_init_host_argument(host, base_url):
+    """Test host argument normalization"""
+    assert Alpha2Base(host).base_url == base_url
 
 
 @pytest.mark.parametrize(
@@ -30,10 +73,10 @@ def test_convert_types_from_xml(entity_type, attribute, value, expected_value):
     assert result == expected_value
 
 
-def test_convert_types_from_xml_error():
-    """Test type conversion from xml error"""
-    with pytest.raises(ValueError):
-        Alpha2Base.convert_types_from_xml("INVALID", {})
+def test_convert_types_from_xml_nr():
+    """Test conversion of the nr attribute from xml"""
+    result = Alpha2Base.convert_types_from_xml("HEATCTRL", {"@nr": "3", "INUSE": "1"})
+    assert result == {"NR": 3, "INUSE": True}
 
 
 @pytest.mark.parametrize(
@@ -41,9 +84,14 @@ def test_convert_types_from_xml_error():
     (
         ("HEATAREA", "BLOCK_HC", True, "1"),
         ("HEATAREA", "BLOCK_HC", False, "0"),
+        ("HEATAREA", "BLOCK_HC", "0", "0"),
+        ("HEATAREA", "BLOCK_HC", 1, "1"),
         ("HEATAREA", "HEATAREA_NAME", "2", "2"),
         ("HEATAREA", "HEATAREA_MODE", 1, "1"),
-        ("HEATAREA", "T_ACTUAL", 19.2122312, "19.2")
+        ("HEATAREA", "T_ACTUAL", 19.2122312, "19.2"),
+        ("HEATAREA", "T_TARGET", "21", "21.0"),
+        ("HEATAREA", "T_TARGET", 21, "21.0"),
+        ("HEATAREA", "OFFSET", -1.04, "-1.0")
     )
 )
 def test_convert_types_for_xml(entity_type, attribute, value, expected_value):
@@ -53,13 +101,13 @@ def test_convert_types_for_xml(entity_type, attribute, value, expected_value):
     assert result == expected_value
 
 
-def test_convert_types_for_xml_error():
-    """Test type conversion for xml error"""
+@pytest.mark.parametrize('convert', (Alpha2Base.convert_types_from_xml, Alpha2Base.convert_types_for_xml))
+def test_convert_types_error(convert):
+    """Test type conversion error for invalid entity type"""
     with pytest.raises(ValueError):
-        Alpha2Base.convert_types_for_xml("INVALID", {})
+        convert("INVALID", {})
 
 
-@pytest.mark.asyncio
 @pytest.mark.parametrize(
     'xml_file, base_id, base_name, num_heat_areas, num_heat_controls, num_io_devices',
     (
@@ -67,50 +115,322 @@ def test_convert_types_for_xml_error():
         ("static2.xml", "Alpha2Test", "Alpha2Test", 1, 12, 1)
     )  # pylint: disable=too-many-arguments
 )
-async def test_parse_xml(xml_file, base_id, base_name, num_heat_areas, num_heat_controls, num_io_devices):
+def test_parse_xml(parsed_bases, xml_file, base_id, base_name, num_heat_areas, num_heat_controls, num_io_devices):
     """Test xml parsing"""
-    async def _fetch_static_data(_self):
-        with open(os.path.join("tests/data", xml_file), "r", encoding="utf-8") as file:
-            return file.read()
-    with patch("moehlenhoff_alpha2.Alpha2Base._fetch_static_data", _fetch_static_data):
-        base = Alpha2Base("127.0.0.1")
+    base = parsed_bases[xml_file]
+    assert base.id == base_id
+    assert base.name == base_name
+
+    assert len(base.heat_areas) == num_heat_areas
+    assert len(base.heat_controls) == num_heat_controls
+    assert len(base.io_devices) == num_io_devices
+
+
+@pytest.mark.parametrize('xml_file', ("static1.xml", "static2.xml"))
+def test_parse_static_xml(xml_file):
+    """Test that the parsed static data has the same structure xmltodict returns"""
+    data = _XML_CACHE[xml_file]
+    force_list = Alpha2Base._ENTITY_TYPES  # pylint: disable=protected-access
+    static_data = Alpha2Base("127.0.0.1")._parse_static_xml(data)  # pylint: disable=protected-access
+    assert static_data == xmltodict.parse(data, force_list=force_list)
+
+
+def test_set_static_data():
+    """Test assigning static data"""
+    base = Alpha2Base("127.0.0.1")
+    base.static_data = xmltodict.parse(_XML_CACHE["static1.xml"])
+    assert base.name == "EZR012345"
+    assert base.cooling is False
+    assert len(base.heat_areas) == 6
+    assert base.heat_areas[0]["ID"] == "EZR012345:1"
+    assert base.get_heat_control(4)["_HEATAREA_ID"] == "EZR012345:4"
+
+    base.static_data = None
+    assert base.static_data is None
+    with pytest.raises(RuntimeError):
+        print(base.name)
+
+
+def test_heatarea_ids(parsed_bases):
+    """Test _HEATAREA_ID attribute"""
+    base = parsed_bases["static1.xml"]
+
+    assert base.get_heat_control(1)["_HEATAREA_ID"] == "EZR012345:1"
+    assert base.get_heat_control(2)["_HEATAREA_ID"] == "EZR012345:1"
+    assert base.get_heat_control(3)["_HEATAREA_ID"] == "EZR012345:1"
+    assert base.get_heat_control(4)["_HEATAREA_ID"] == "EZR012345:4"
+    assert base.get_heat_control(5)["_HEATAREA_ID"] == "EZR012345:5"
+    assert base.get_heat_control(6)["_HEATAREA_ID"] == "EZR012345:6"
+    assert base.get_heat_control(7)["_HEATAREA_ID"] == "EZR012345:7"
+    assert base.get_heat_control(8)["_HEATAREA_ID"] == "EZR012345:8"
+    assert base.get_heat_control(9)["_HEATAREA_ID"] is None
+    assert base.get_heat_control(13) is None
+
+    io_devices = {io["NR"]: io for io in base.io_devices}
+    assert io_devices[1]["_HEATAREA_ID"] == "EZR012345:7"
+    assert io_devices[2]["_HEATAREA_ID"] == "EZR012345:5"
+    assert io_devices[3]["_HEATAREA_ID"] == "EZR012345:6"
+    assert io_devices[4]["_HEATAREA_ID"] == "EZR012345:8"
+    assert io_devices[5]["_HEATAREA_ID"] == "EZR012345:1"
+    assert io_devices[6]["_HEATAREA_ID"] == "EZR012345:4"
+
+
+def test_heatctrl_state(parsed_bases):
+    """Test _HEATCTRL_STATE attribute"""
+    base = parsed_bases["static1.xml"]
+
+    heat_areas = {ha["NR"]: ha for ha in base.heat_areas}
+    assert heat_areas[1]["_HEATCTRL_STATE"] == 1
+    assert heat_areas[4]["_HEATCTRL_STATE"] == 1
+    assert heat_areas[5]["_HEATCTRL_STATE"] == 0
+    assert heat_areas[6]["_HEATCTRL_STATE"] == 1
+
+
+@pytest.mark.asyncio
+async def test_session():
+    """Test client session reuse and close"""
+    async with Alpha2Base("127.0.0.1") as base:
+        session = await base._get_session()  # pylint: disable=protected-access
+        assert await base._get_session() is session  # pylint: disable=protected-access
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_static_data_not_modified(local_base):
+    """Test conditional fetch of static data"""
+    xml = _XML_CACHE["static1.xml"]
+    requests = []
+
+    async def _static_xml(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"1"':
+            return web.Response(status=304)
+        return web.Response(body=xml, headers={"ETag": '"1"'})
+
+    async def _changes_xml(_request):
+        return web.Response(text="")
+
+    async with local_base(_static_xml, _changes_xml) as base:
+        await base.update_data()
+        static_data = base.static_data
+        await base.update_data()
+        assert base.static_data is static_data
+        await base.send_command("<COOLING>0</COOLING>")
         await base.update_data()
-        assert base.id == base_id
-        assert base.name == base_name
+        assert base.static_data is not static_data
+    assert requests == [None, '"1"', None]
 
-        assert len(list(base.heat_areas)) == num_heat_areas
-        assert len(list(base.heat_controls)) == num_heat_controls
-        assert len(list(base.io_devices)) == num_io_devices
+
+@pytest.mark.asyncio
+async def test_static_data_command_during_fetch(local_base):
+    """Test that static data fetched while a command is sent is fetched again"""
+    xml = _XML_CACHE["static1.xml"]
+    requests = []
+
+    async def _static_xml(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"1"':
+            return web.Response(status=304)
+        await asyncio.sleep(0.1)
+        return web.Response(body=xml, headers={"ETag": '"1"'})
+
+    async def _changes_xml(_request):
+        return web.Response(text="")
+
+    async with local_base(_static_xml, _changes_xml) as base:
+        update = asyncio.create_task(base.update_data())
+        await asyncio.sleep(0.05)
+        await base._send_command("EZR012345", "<COOLING>0</COOLING>")  # pylint: disable=protected-access
+        await update
+        await base.update_data()
+        await base.update_data()
+    assert requests == [None, None, '"1"']
 
 
 @pytest.mark.asyncio
-async def test_heatarea_ids():
-    """Test _HEATAREA_ID attribute"""
-    async def _fetch_static_data(_self):
-        with open(os.path.join("tests/data/static1.xml"), "r", encoding="utf-8") as file:
-            return file.read()
-    with patch("moehlenhoff_alpha2.Alpha2Base._fetch_static_data", _fetch_static_data):
-        base = Alpha2Base("127.0.0.1")
+async def test_static_data_invalid(local_base):
+    """Test that static data which fails to parse is fetched again"""
+    xml = _XML_CACHE["static1.xml"]
+    responses = [xml[:len(xml) // 2], xml]
+    requests = []
+
+    async def _static_xml(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"1"':
+            return web.Response(status=304)
+        return web.Response(body=responses.pop(0), headers={"ETag": '"1"'})
+
+    async with local_base(_static_xml) as base:
+        # lxml and ElementTree parse errors are both SyntaxErrors
+        with pytest.raises(SyntaxError):
+            await base.update_data()
+        assert base.static_data is None
         await base.update_data()
+        assert base.static_data is not None
+        await base.update_data()
+    assert requests == [None, None, '"1"']
+
+
+@pytest.mark.asyncio
+async def test_static_data_conversion_error(local_base):
+    """Test that static data which fails to convert leaves the previous data in place"""
+    responses = [_XML_CACHE["static1.xml"], _XML_CACHE["static2.xml"].replace(b"<INUSE>1</INUSE>", b"<INUSE>x</INUSE>")]
+
+    async def _static_xml(_request):
+        return web.Response(body=responses.pop(0))
+
+    async with local_base(_static_xml) as base:
+        await base.update_data()
+        static_data = base.static_data
+        with pytest.raises(ValueError):
+            await base.update_data()
+        assert base.static_data is static_data
+        assert base.id == "EZR012345"
+        assert len(base.heat_areas) == 6
+        assert all(heat_area["ID"].startswith("EZR012345:") for heat_area in base.heat_areas)
+
+
+@pytest.mark.asyncio
+async def test_update_heat_area_command(local_base):
+    """Test the command sent by update_heat_area"""
+    commands = []
+
+    async def _changes_xml(request):
+        commands.append(await request.read())
+        return web.Response(text="")
+
+    async with local_base(changes_xml=_changes_xml) as base:
+        await base.update_heat_area("EZR012345:4", {"T_TARGET": 21.24, "BLOCK_HC": True})
+    assert commands == [
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<Devices><Device><ID>EZR012345</ID>'
+        b'<HEATAREA nr="4"><T_TARGET>21.2</T_TARGET><BLOCK_HC>1</BLOCK_HC></HEATAREA>'
+        b'</Device></Devices>'
+    ]
+
+    commands.clear()
+    async with local_base(changes_xml=_changes_xml) as base:
+        await asyncio.gather(
+            base.update_heat_area("EZR012345:4", {"T_TARGET": 21.0}),
+            base.update_heat_area("EZR012345:4", {"HEATAREA_MODE": 1}),
+            base.update_heat_area("EZR012345:5", {"T_TARGET": 19.0}),
+        )
+    assert commands == [
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<Devices><Device><ID>EZR012345</ID>'
+        b'<HEATAREA nr="4"><T_TARGET>21.0</T_TARGET><HEATAREA_MODE>1</HEATAREA_MODE></HEATAREA>'
+        b'<HEATAREA nr="5"><T_TARGET>19.0</T_TARGET></HEATAREA>'
+        b'</Device></Devices>'
+    ]
+
+
+@pytest.mark.asyncio
+async def test_update_heat_area_command_error(local_base):
+    """Test that a failed command only fails the updates of its device"""
+    commands = []
+
+    async def _changes_xml(request):
+        command = await request.read()
+        commands.append(command)
+        if b"<ID>EZR012345</ID>" in command:
+            return web.Response(status=500)
+        return web.Response(text="")
+
+    async with local_base(changes_xml=_changes_xml) as base:
+        results = await asyncio.gather(
+            base.update_heat_area("EZR012345:4", {"T_TARGET": 21.0}),
+            base.update_heat_area("EZR054321:1", {"T_TARGET": 19.0}),
+            return_exceptions=True,
+        )
+    assert isinstance(results[0], aiohttp.ClientResponseError)
+    assert results[1] is None
+    # The failed command is retried once, the other device is updated anyway
+    assert len(commands) == 3
+    assert b"<ID>EZR054321</ID>" in commands[-1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cancel_after', (0, 0.01))
+async def test_update_heat_area_cancelled(local_base, cancel_after):
+    """Test update_heat_area after a batch was cancelled before or while waiting for more updates"""
+    commands = []
+
+    async def _changes_xml(request):
+        commands.append(await request.read())
+        return web.Response(text="")
+
+    async with local_base(changes_xml=_changes_xml) as base:
+        update = asyncio.create_task(base.update_heat_area("EZR012345:4", {"T_TARGET": 21.0}))
+        await asyncio.sleep(cancel_after)
+        base._heat_area_update_task.cancel()  # pylint: disable=protected-access
+        with pytest.raises(asyncio.CancelledError):
+            await update
+        await base.update_heat_area("EZR012345:5", {"T_TARGET": 19.0})
+    assert commands == [
+        b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<Devices><Device><ID>EZR012345</ID>'
+        b'<HEATAREA nr="5"><T_TARGET>19.0</T_TARGET></HEATAREA>'
+        b'</Device></Devices>'
+    ]
+
+
+@pytest.mark.asyncio
+async def test_set_cooling_command(local_base):
+    """Test set_cooling waiting for the command to take effect"""
+    cooling = {"value": "0", "requested": None, "polls": []}
+
+    async def _static_xml(request):
+        etag = f'"{cooling["value"]}"'
+        cooling["polls"].append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == etag:
+            response = web.Response(status=304)
+        else:
+            xml = _XML_CACHE["static1.xml"].replace(b"<COOLING>0</COOLING>", f"<COOLING>{cooling['value']}</COOLING>".encode())
+            response = web.Response(body=xml, headers={"ETag": etag})
+        if cooling["requested"] and len(cooling["polls"]) == 2:
+            # The base applies the command after the second poll
+            cooling["value"] = cooling["requested"]
+        return response
+
+    async def _changes_xml(request):
+        cooling["requested"] = "1" if b"<COOLING>1</COOLING>" in await request.read() else "0"
+        cooling["polls"] = []
+        return web.Response(text="")
+
+    async with local_base(_static_xml, _changes_xml) as base:
+        base._command_poll_delay = 0.01  # pylint: disable=protected-access
+        await base.update_data()
+        assert base.cooling is False
+        await base.set_cooling(True)
+        assert base.cooling is True
+        # Polls after the first one are conditional
+        assert cooling["polls"] == [None, '"0"', '"0"']
 
-        heat_controls = {hc["NR"]: hc for hc in base.heat_controls}
-        assert heat_controls[1]["_HEATAREA_ID"] == "EZR012345:1"
-        assert heat_controls[2]["_HEATAREA_ID"] == "EZR012345:1"
-        assert heat_controls[3]["_HEATAREA_ID"] == "EZR012345:1"
-        assert heat_controls[4]["_HEATAREA_ID"] == "EZR012345:4"
-        assert heat_controls[5]["_HEATAREA_ID"] == "EZR012345:5"
-        assert heat_controls[6]["_HEATAREA_ID"] == "EZR012345:6"
-        assert heat_controls[7]["_HEATAREA_ID"] == "EZR012345:7"
-        assert heat_controls[8]["_HEATAREA_ID"] == "EZR012345:8"
-        assert heat_controls[9]["_HEATAREA_ID"] is None
 
-        io_devices = {io["NR"]: io for io in base.io_devices}
-        assert io_devices[1]["_HEATAREA_ID"] == "EZR012345:7"
-        assert io_devices[2]["_HEATAREA_ID"] == "EZR012345:5"
-        assert io_devices[3]["_HEATAREA_ID"] == "EZR012345:6"
-        assert io_devices[4]["_HEATAREA_ID"] == "EZR012345:8"
-        assert io_devices[5]["_HEATAREA_ID"] == "EZR012345:1"
-        assert io_devices[6]["_HEATAREA_ID"] == "EZR012345:4"
+@pytest.mark.asyncio
+async def test_set_cooling_command_error(local_base):
+    """Test that set_cooling passes on errors sending the command"""
+    polls = []
+
+    async def _static_xml(_request):
+        polls.append(None)
+        return web.Response(body=_XML_CACHE["static1.xml"])
+
+    async def _changes_xml(_request):
+        await asyncio.sleep(1)
+        return web.Response(text="")
+
+    async with local_base(_static_xml, _changes_xml) as base:
+        await base.update_data()
+        base._client_timeout = aiohttp.ClientTimeout(total=0.2)  # pylint: disable=protected-access
+        await base.close()
+        with pytest.raises((asyncio.TimeoutError, aiohttp.ClientError)) as excinfo:
+            await base.set_cooling(True)
+        assert "take effect" not in str(excinfo.value)
+        num_polls = len(polls)
+        await asyncio.sleep(0.5)
+        # The poll was cancelled
+        assert len(polls) == num_polls
 
 
 @pytest.mark.asyncio
@@ -124,9 +444,8 @@ async def test_ensure_static_data():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_get_heat_areas():
+async def test_get_heat_areas(base):
     """Test getting heat areas"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
     heat_areas = list(base.heat_areas)
     assert len(heat_areas) > 0
@@ -137,29 +456,49 @@ async def test_get_heat_areas():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_update_heat_areas():
+async def test_update_heat_areas(base):
     """Test updating heat areas"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
-    heat_area = list(base.heat_areas)[0]
-    t_target = round(heat_area["T_TARGET"] + 0.2, 1)
+    heat_area = base.heat_areas[0]
+    # Temperatures are sent and reported with one decimal
+    t_target = heat_area["T_TARGET"] + 0.2
     await base.update_heat_area(heat_area["ID"], {"T_TARGET": t_target})
     await base.update_data()
-    heat_area = list(base.heat_areas)[0]
-    assert heat_area["T_TARGET"] == t_target
+    heat_area = base.heat_areas[0]
+    assert heat_area["T_TARGET"] == pytest.approx(t_target, abs=0.05)
 
-    t_target = round(heat_area["T_TARGET"] - 0.2, 1)
+    t_target = heat_area["T_TARGET"] - 0.2
     await base.update_heat_area(int(heat_area["ID"].split(":")[-1]), {"T_TARGET": t_target})
     await base.update_data()
-    heat_area = list(base.heat_areas)[0]
-    assert heat_area["T_TARGET"] == t_target
+    heat_area = base.heat_areas[0]
+    assert heat_area["T_TARGET"] == pytest.approx(t_target, abs=0.05)
 
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_get_set_cooling():
+async def test_update_heat_areas_batch(base):
+    """Test updating two heat areas in one command"""
+    await base.update_data()
+    if len(base.heat_areas) < 2:
+        pytest.skip("Base has less than two heat areas")
+    heat_areas = base.heat_areas[:2]
+    for delta in (0.2, -0.2):
+        t_targets = [heat_area["T_TARGET"] + delta for heat_area in heat_areas]
+        # Both updates are sent in one command
+        await asyncio.gather(*(
+            base.update_heat_area(heat_area["ID"], {"T_TARGET": t_target})
+            for heat_area, t_target in zip(heat_areas, t_targets)
+        ))
+        await base.update_data()
+        heat_areas = base.heat_areas[:2]
+        for heat_area, t_target in zip(heat_areas, t_targets):
+            assert heat_area["T_TARGET"] == pytest.approx(t_target, abs=0.05)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
+async def test_get_set_cooling(base):
     """Test getting and setting cooling mode"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
     await base.set_cooling(True)
     assert base.cooling is True
@@ -176,14 +515,13 @@ async def test_get_set_cooling():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_set_cooling_timeout():
+async def test_set_cooling_timeout(base):
     """Test getting and setting cooling mode"""
     command_timeout = Alpha2Base._command_timeout  # pylint: disable=protected-access
     command_poll_interval = Alpha2Base._command_poll_interval  # pylint: disable=protected-access
     Alpha2Base._command_timeout = 0.1  # pylint: disable=protected-access
     Alpha2Base._command_poll_interval = 0.1  # pylint: disable=protected-access
     try:
-        base = Alpha2Base(ALPHA2_BASE_ADDRESS)
         await base.update_data()
         with pytest.raises(TimeoutError):
             await base.set_cooling(True)
@@ -195,9 +533,8 @@ async def test_set_cooling_timeout():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_command():
+async def test_command(base):
     """Test getting and setting cooling mode"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
     await base.send_command("<COOLING>1</COOLING>")
     await asyncio.sleep(3)
@@ -206,9 +543,8 @@ async def test_command():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_update_lock():
+async def test_update_lock(base):
     """Test update lock"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
     coros = [
         base.set_cooling(True),
@@ -221,20 +557,19 @@ async def test_update_lock():
 
 @pytest.mark.asyncio
 @pytest.mark.skipif(not ALPHA2_BASE_ADDRESS, reason="ALPHA2_BASE_ADDRESS not set in environment")
-async def test_set_datetime():
+async def test_set_datetime(base):
     """Test set datetime"""
-    base = Alpha2Base(ALPHA2_BASE_ADDRESS)
     await base.update_data()
 
     value = datetime(2010, 1, 1, 0, 0, 0)
     await base.set_datetime(value)
     await asyncio.sleep(5)
     await base.update_data()
-    base_dt = datetime.strptime(base.static_data["Devices"]["Device"]["DATETIME"], "%Y-%m-%dT%H:%M:%S")
+    base_dt = datetime.fromisoformat(base.static_data["Devices"]["Device"]["DATETIME"])
     assert abs((base_dt - value).total_seconds()) < 10
 
     await base.set_datetime()
     await asyncio.sleep(5)
     await base.update_data()
-    base_dt = datetime.strptime(base.static_data["Devices"]["Device"]["DATETIME"], "%Y-%m-%dT%H:%M:%S")
+    base_dt = datetime.fromisoformat(base.static_data["Devices"]["Device"]["DATETIME"])
     assert abs((base_dt - datetime.now()).total_seconds()) < 10